@@ -2,10 +2,23 @@ __version__ = "0.1.0"
 
 
 from collections import defaultdict
-from fnmatch import fnmatchcase
+from fnmatch import translate
+from functools import lru_cache
+from gc import disable as gc_disable
+from gc import enable as gc_enable
+from gc import isenabled as gc_isenabled
+from logging import DEBUG
+from mmap import ACCESS_READ, mmap
+from operator import methodcaller
+from os import environ, fstat, geteuid
 from pathlib import Path
+from pickle import dump as pickle_dump
+from pickle import load as pickle_load
 from platform import uname
-from re import search
+from re import compile as re_compile
+from stat import S_IWGRP, S_IWOTH
+from sys import intern
+from tempfile import mkstemp
 
 from zenlib.logging import loggify
 from zenlib.util import colorize as c_
@@ -16,11 +29,86 @@ from .kmod_errors import UnknownAliasError, UnknownKernelVersionError
 # Modules that are built-in and do not require a kmod
 _BUILTIN_NO_KMOD = ["pcieport"]
 
+# Version of the cache file layout, bump it when the cached attributes or their contents change
+_CACHE_FORMAT = 1
+
+# Characters which start a wildcard in fnmatch patterns
+_GLOB_SPECIAL = re_compile(r"[*?\[]")
+# virtio aliases are in the format: d<device id>v<vendor id>
+_VIRTIO_RE = re_compile(r"d(?P<device_id>[0-9a-fA-F\*]+)v(?P<vendor_id>[0-9a-fA-F\*]*)")
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Returns the literal part of a glob pattern before the first wildcard."""
+    if wildcard := _GLOB_SPECIAL.search(pattern):
+        return pattern[: wildcard.start()]
+    return pattern
+
+
+def _compile_matcher(pattern: str):
+    """Compiles a glob pattern to a function which returns a truthy value if a string matches it.
+    Literal patterns and patterns with a single trailing '*' use string comparisons, others use a compiled regex.
+    A single '*' between a literal prefix and suffix also uses the regex, a Python function checking the prefix,
+    suffix and length is slower than re.match for strings as long as a modalias.
+    """
+    prefix = _literal_prefix(pattern)
+    if prefix == pattern:
+        return pattern.__eq__
+    if pattern == prefix + "*":
+        return methodcaller("startswith", prefix)
+    return re_compile(translate(pattern)).match
+
+
+class _AliasTrie:
+    """A byte trie of alias matcher indexes, keyed on the literal prefix of each matcher.
+    Walking an alias through the trie collects only the matchers which could match it.
+    """
+
+    __slots__ = ("child_bytes", "children", "terminals")
+
+    def __init__(self):
+        # Child bytes are packed into one buffer so lookups are a single bytearray.find, children share its offsets
+        self.child_bytes = bytearray()
+        self.children = []
+        self.terminals = []  # Indexes of matchers whose literal prefix ends at this node
+
+    def descend(self, byte: int):
+        """Returns the child node for the byte, or None if it does not exist."""
+        if (offset := self.child_bytes.find(byte)) >= 0:
+            return self.children[offset]
+
+    def descend_mut_or_insert(self, byte: int) -> "_AliasTrie":
+        """Returns the child node for the byte, creating it if it does not exist."""
+        if (child := self.descend(byte)) is None:
+            child = _AliasTrie()
+            self.child_bytes.append(byte)
+            self.children.append(child)
+        return child
+
+    def insert(self, key: bytes, index: int) -> None:
+        """Adds a matcher index at the node for the key."""
+        node = self
+        for byte in key:
+            node = node.descend_mut_or_insert(byte)
+        node.terminals.append(index)
+
+    def candidates(self, key: bytes) -> list[int]:
+        """Returns the matcher indexes of every node on the path of the key."""
+        node = self
+        found = list(node.terminals)
+        for byte in key:  # descend is inlined, this is the hot loop for alias resolution
+            if (offset := node.child_bytes.find(byte)) < 0:
+                break
+            node = node.children[offset]
+            found.extend(node.terminals)
+        return found
+
 
 @loggify
 class KmodDB(KmodEnumerators):
     """A class to manage kernel module metadata.
     Can be initailized with a kernel version, or uses the current kernel version.
+    With use_cache, the parsed module info is loaded from and saved to a cache file under $XDG_CACHE_HOME.
     """
 
     @staticmethod
@@ -50,11 +138,34 @@ class KmodDB(KmodEnumerators):
 
         return keys
 
-    def __init__(self, kernel_version: str = None, *args, **kwargs):
+    # Attributes saved to the cache file, along with the attribute for each plain bus
+    _CACHE_ATTRS = [
+        "builtin",
+        "aliases",
+        "_cpu_arch",
+        "_cpu_info",
+        "_cpu_features",
+        "dmi",
+        "of",
+        "virtio",
+        "_dmi_by_first_part",
+        "_bus_patterns",
+        "_bus_modules",
+        "_bus_ranks",
+        "_bus_module_ranks",
+        "_of_vendorless_patterns",
+    ]
+
+    def __init__(self, kernel_version: str = None, use_cache: bool = False, *args, **kwargs):
         self.kernel_version = kernel_version or uname().release
+        # Cache alias lookups, devices under the same controller often share modaliases
+        self._resolve_cached = lru_cache(maxsize=4096)(self._resolve_module_alias)
         self.builtin = set()  # Set to store builtin modules
         self.aliases = defaultdict(list)  # Dictionary where keys are module names and values are lists of aliases
-        self.cpu = defaultdict(list)  # Dictionary where keys are module names and values are lists of CPU aliases
+        # Parallel lists of the arch, info, and features of CPU aliases, keyed by module name
+        self._cpu_arch = defaultdict(list)
+        self._cpu_info = defaultdict(list)
+        self._cpu_features = defaultdict(list)
         self.dmi = defaultdict(list)  # Dictionary where keys are module names and values are lists of DMI aliases
         self.of = defaultdict(
             list
@@ -62,6 +173,19 @@ class KmodDB(KmodEnumerators):
         self.virtio = defaultdict(
             list
         )  # Dictionary for virtio aliases, keys are module names, values are lists of dicts of matcher keys and values
+        # Lists of (module, DMI parts) for DMI aliases, keyed on the literal prefix of the first part
+        self._dmi_by_first_part = defaultdict(list)
+        # Parallel lists of patterns, modules, and compiled matchers for each bus, plain aliases use None
+        self._bus_patterns = defaultdict(list)
+        self._bus_modules = defaultdict(list)
+        self._bus_matchers = defaultdict(list)  # None until the matcher is first used
+        # Matchers are checked grouped by module, in the order each module was first seen, like the per-bus dicts
+        self._bus_ranks = defaultdict(list)  # Rank of the module for each matcher, parallel to the lists above
+        self._bus_module_ranks = defaultdict(dict)  # Rank of each module, keyed by bus and module name
+        self._bus_tries = {}  # Tries of indexes into the lists above, built the first time each bus is used
+        self._of_vendorless_patterns = {}  # OF matchers without the vendor ID, keyed by index
+        self._of_vendorless_trie = None  # Indexes of OF matchers keyed on the vendorless matcher, built on first use
+        self._matchers = {}  # Compiled matchers keyed by glob pattern, compiled the first time each is used
         self.ignored_busses = [
             "auxiliary",
             "cxl",
@@ -96,6 +220,9 @@ class KmodDB(KmodEnumerators):
 
         # List of busses that are considered plain and do not require special handling
         self.plain_busses = ["acpi", "devname", "i2c", "isa", "mhi", "usb", "scsi", "spi", "pci", "platform", "xen"]
+        # Sets of the bus lists, used for membership checks while processing aliases
+        self._ignored_busses = frozenset(self.ignored_busses)
+        self._plain_busses = frozenset(self.plain_busses)
 
         for bus in self.plain_busses:
             if getattr(self, bus, None) is not None:
@@ -105,8 +232,11 @@ class KmodDB(KmodEnumerators):
             # Initialize each bus in the dictionary with a defaultdict of lists
             setattr(self, bus, defaultdict(list))
 
-        self.get_builtin_module_info()  # Load builtin module info
-        self.get_module_aliases()  # Process module alias information
+        if not (use_cache and self.load_cache()):
+            self.get_builtin_module_info()  # Load builtin module info
+            self.get_module_aliases()  # Process module alias information
+            if use_cache:
+                self.save_cache()
 
     @property
     def kernel_version(self) -> str:
@@ -116,7 +246,8 @@ class KmodDB(KmodEnumerators):
     @kernel_version.setter
     def kernel_version(self, value: str):
         """Sets the kernel version, checking it's a valid version."""
-        if value not in self._get_kernel_versions():
+        # The version must be a single path component, it is used to build paths under /lib/modules and the cache
+        if "/" in value or value in ("", ".", "..") or not (Path("/lib/modules") / value).is_dir():
             raise UnknownKernelVersionError(
                 f"Unknown kernel version: {value}. Available versions: {', '.join(self._get_kernel_versions())}"
             )
@@ -142,8 +273,90 @@ class KmodDB(KmodEnumerators):
             )
         return alias_file
 
+    @property
+    def cache_file(self) -> Path:
+        """Returns the path to the cache file for the current kernel version.
+        Each kernel version has its own directory, files are named after the mtimes of the module info files.
+        """
+        alias_mtime = self.modules_alias.stat().st_mtime_ns
+        builtin_mtime = self.modules_builtin_modinfo.stat().st_mtime_ns
+        cache_dir = Path(environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "kmod_db" / self.kernel_version
+        return cache_dir / f"{alias_mtime}-{builtin_mtime}.pkl"
+
+    def load_cache(self) -> bool:
+        """Loads the parsed module info from the cache file, returns True if it was loaded.
+        Cache files which are not owned by the effective user, or are writable by others, are not loaded.
+        """
+        try:
+            cache_file = self.cache_file
+        except (OSError, RuntimeError) as e:  # RuntimeError is raised if the home directory can't be determined
+            self.logger.warning(f"Unable to determine the cache file path, not using the cache: {e}")
+            return False
+
+        # The garbage collector would otherwise repeatedly scan the many small objects created while loading
+        gc_enabled = gc_isenabled()
+        gc_disable()
+        try:
+            try:
+                with open(cache_file, "rb") as f:
+                    cache_stat = fstat(f.fileno())
+                    if cache_stat.st_uid != geteuid() or cache_stat.st_mode & (S_IWGRP | S_IWOTH):
+                        self.logger.warning(
+                            f"Ignoring cache file owned by another user or writable by others: {c_(cache_file, 'red')}"
+                        )
+                        return False
+                    cache_format, data = pickle_load(f)
+            except FileNotFoundError:
+                return False
+            except Exception as e:
+                self.logger.warning(f"Failed to load cache file {c_(cache_file, 'yellow')}: {e}")
+                return False
+
+            if cache_format != _CACHE_FORMAT:
+                self.logger.info(f"Ignoring cache file with format {c_(cache_format, 'yellow')}: {cache_file}")
+                return False
+
+            for attr, value in data.items():
+                setattr(self, attr, value)
+        finally:
+            if gc_enabled:
+                gc_enable()
+
+        # Compiled matchers are not cached, they are compiled on first use
+        for bus, patterns in self._bus_patterns.items():
+            self._bus_matchers[bus] = [None] * len(patterns)
+        self.logger.debug(f"[{c_(self.kernel_version, 'magenta')}] Loaded module info from cache: {cache_file}")
+        return True
+
+    def save_cache(self) -> None:
+        """Saves the parsed module info to the cache file, removing stale cache files for the kernel version.
+        Failures are logged, the cache is only used to speed up loading.
+        """
+        try:
+            cache_file = self.cache_file
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            data = {attr: getattr(self, attr) for attr in self._CACHE_ATTRS + self.plain_busses}
+            # Write to a temporary file, created with mode 0600, then move it into place
+            fd, temp_name = mkstemp(dir=cache_file.parent, suffix=".tmp")
+            try:
+                with open(fd, "wb") as f:
+                    pickle_dump((_CACHE_FORMAT, data), f, protocol=5)
+                Path(temp_name).replace(cache_file)
+            except BaseException:
+                Path(temp_name).unlink(missing_ok=True)
+                raise
+
+            for stale_file in cache_file.parent.glob("*.pkl"):
+                if stale_file != cache_file:
+                    stale_file.unlink()
+        except Exception as e:
+            return self.logger.warning(f"Failed to write the module info cache: {e}")
+        self.logger.debug(f"[{c_(self.kernel_version, 'magenta')}] Saved module info to cache: {cache_file}")
+
     def resolve_module_alias(self, alias: str, bus=None) -> str:
-        """Resolves a kernel module alias to a module name. If the alias is not found, raises an UnknownAliasError."""
+        """Resolves a kernel module alias to a module name. If the alias is not found, raises an UnknownAliasError.
+        The bus prefix is removed and checked here, so warnings are logged on every call, not only on cache misses.
+        """
         for bus_name in self.plain_busses:
             if alias.startswith(bus_name + ":"):
                 if bus and bus != bus_name:
@@ -154,65 +367,122 @@ class KmodDB(KmodEnumerators):
                 alias = alias.removeprefix(bus_name + ":").strip()
                 break
 
-        if bus:
-            if bus not in self.plain_busses:
-                self.logger.warning(
-                    f"Bus {c_(bus, 'yellow')} is not a plain bus, alias resolution may not work as expected."
-                )
-            else:
+        if bus and bus not in self._plain_busses:
+            self.logger.warning(
+                f"Bus {c_(bus, 'yellow')} is not a plain bus, alias resolution may not work as expected."
+            )
+
+        if module := self._resolve_cached(alias, bus):
+            return module
+        raise UnknownAliasError(f"Kernel module alias not found: {c_(alias, 'red', bold=True)}")
+
+    def _resolve_module_alias(self, alias: str, bus=None) -> str | None:
+        """Resolves a kernel module alias without a bus prefix to a module name, returning None if it is not found.
+        Wrapped by self._resolve_cached, so unknown aliases are cached as well.
+        The cache is cleared when a matcher is added to a bus which has already been used for resolution.
+        """
+        if bus in self._plain_busses:
+            if self.logger.isEnabledFor(DEBUG):
                 self.logger.debug(f"Resolving alias {c_(alias, 'blue')} on bus {c_(bus, 'yellow')}")
-                for module, matchers in getattr(self, bus).items():
-                    for matcher in matchers:
-                        if fnmatchcase(alias, matcher):
-                            self.logger.debug(f"Resolved alias {c_(alias, 'blue')} to module {c_(module, 'cyan')}")
-                            return module
-
-        for module, aliases in self.aliases.items():
-            for a in aliases:
-                if fnmatchcase(alias, a):
-                    print(a)
-                    self.logger.debug(f"Resolved alias {c_(alias, 'blue')} to module {c_(module, 'cyan')}")
+            modules, matchers = self._bus_modules[bus], self._bus_matchers[bus]
+            for index in self._resolution_order(bus, self._bus_trie(bus).candidates(alias.encode())):
+                if (matchers[index] or self._bus_matcher(bus, index))(alias):
+                    module = modules[index]
+                    if self.logger.isEnabledFor(DEBUG):
+                        self.logger.debug(f"Resolved alias {c_(alias, 'blue')} to module {c_(module, 'cyan')}")
                     return module
 
+        modules, matchers = self._bus_modules[None], self._bus_matchers[None]
+        for index in self._resolution_order(None, self._bus_trie(None).candidates(alias.encode())):
+            if (matchers[index] or self._bus_matcher(None, index))(alias):
+                module = modules[index]
+                if self.logger.isEnabledFor(DEBUG):
+                    self.logger.debug(f"Resolved alias {c_(alias, 'blue')} to module {c_(module, 'cyan')}")
+                return module
 
-        if module := self.resolve_of_alias(alias):
-            return module
+        try:
+            if module := self.resolve_of_alias(alias):
+                return module
+        except UnknownAliasError:
+            return None
 
-        if bus != "platform" and (platform_alias := self.resolve_module_alias(alias, bus="platform")):
-            self.logger.debug(f"Resolved platform alias {c_(alias, 'blue')} to module {c_(platform_alias, 'cyan')}")
+        if bus != "platform" and (platform_alias := self._resolve_cached(alias, "platform")):
+            if self.logger.isEnabledFor(DEBUG):
+                self.logger.debug(f"Resolved platform alias {c_(alias, 'blue')} to module {c_(platform_alias, 'cyan')}")
             return platform_alias
 
-        raise UnknownAliasError(f"Kernel module alias not found: {c_(alias, 'red', bold=True)}")
-
-
     def resolve_of_alias(self, alias: str) -> str:
         """Resolves an Open Firmware alias to a kernel module name."""
         alias = alias.removeprefix("of:").strip()
-        for module, matchers in self.of.items():
-            for matcher in matchers:
-                # First try to match the alias directly
-                if fnmatchcase(alias, matcher):
-                    self.logger.info(f"Resolved OF alias {c_(alias, 'blue')} to module {c_(module, 'cyan')}")
-                    return module
-
-                # If that fails, try to match without the vendor ID
-                if "," not in alias and "," in matcher:
-                    matcher_with_vendor = matcher.split(",")[-1]
-                    if fnmatchcase(alias, matcher_with_vendor):
-                        self.logger.info(
-                            f"Resolved OF alias {c_(alias, 'blue')} to module {c_(module, 'magenta')}, ignoring vendor ID"
-                        )
-                        return module
+        key = alias.encode()
+        # Direct matches sort before matches without the vendor ID for the same matcher
+        candidates = [(index, False) for index in self._bus_trie("of").candidates(key)]
+        if "," not in alias:
+            candidates += [(index, True) for index in self._get_of_vendorless_trie().candidates(key)]
+
+        ranks = self._bus_ranks["of"]
+        for index, vendorless in sorted(candidates, key=lambda candidate: (ranks[candidate[0]], *candidate)):
+            if vendorless:
+                match = self._matcher(self._of_vendorless_patterns[index])
+            else:
+                match = self._bus_matchers["of"][index] or self._bus_matcher("of", index)
+            if not match(alias):
+                continue
+            module = self._bus_modules["of"][index]
+            if vendorless:
+                self.logger.info(
+                    f"Resolved OF alias {c_(alias, 'blue')} to module {c_(module, 'magenta')}, ignoring vendor ID"
+                )
+            else:
+                self.logger.info(f"Resolved OF alias {c_(alias, 'blue')} to module {c_(module, 'cyan')}")
+            return module
         raise UnknownAliasError(f"Open Firmware alias not found: {c_(alias, 'red', bold=True)}")
 
     def resolve_pci_alias(self, modalias: str) -> str:
         """Resolves a PCI modalias to a kernel module name."""
         modalias = modalias.removeprefix("pci:").strip()
-        for module, matchers in self.pci.items():
-            for matcher in matchers:
-                if fnmatchcase(modalias, matcher):
-                    self.logger.info(f"Resolved PCI modalias {c_(modalias, 'blue')} to module {c_(module, 'cyan')}")
-                    return module
+        modules, matchers = self._bus_modules["pci"], self._bus_matchers["pci"]
+        for index in self._resolution_order("pci", self._bus_trie("pci").candidates(modalias.encode())):
+            if (matchers[index] or self._bus_matcher("pci", index))(modalias):
+                module = modules[index]
+                self.logger.info(f"Resolved PCI modalias {c_(modalias, 'blue')} to module {c_(module, 'cyan')}")
+                return module
+
+    def _matcher(self, pattern: str):
+        """Returns the compiled matcher for a glob pattern, compiling it the first time it is used."""
+        if (match := self._matchers.get(pattern)) is None:
+            match = self._matchers[pattern] = _compile_matcher(pattern)
+        return match
+
+    def _bus_trie(self, bus: str) -> _AliasTrie:
+        """Returns the alias trie for the bus, building it from the pattern list the first time it is used."""
+        if (trie := self._bus_tries.get(bus)) is None:
+            trie = self._bus_tries[bus] = _AliasTrie()
+            for index, pattern in enumerate(self._bus_patterns[bus]):
+                trie.insert(_literal_prefix(pattern).encode(), index)
+        return trie
+
+    def _get_of_vendorless_trie(self) -> _AliasTrie:
+        """Returns the trie of OF matchers with the vendor ID removed, building it the first time it is used.
+        Each matcher shares the index of the full matcher in the OF lists.
+        """
+        if self._of_vendorless_trie is None:
+            self._of_vendorless_trie = _AliasTrie()
+            for index, pattern in self._of_vendorless_patterns.items():
+                self._of_vendorless_trie.insert(_literal_prefix(pattern).encode(), index)
+        return self._of_vendorless_trie
+
+    def _resolution_order(self, bus: str, indexes: list[int]) -> list[int]:
+        """Sorts matcher indexes for the bus by the rank of their module, then by the order they were added."""
+        ranks = self._bus_ranks[bus]
+        return sorted(indexes, key=lambda index: (ranks[index], index))
+
+    def _bus_matcher(self, bus: str, index: int):
+        """Returns the compiled matcher at the index for the bus, compiling it on first use."""
+        matchers = self._bus_matchers[bus]
+        if (match := matchers[index]) is None:
+            match = matchers[index] = _compile_matcher(self._bus_patterns[bus][index])
+        return match
 
 
     def get_builtin_module_info(self) -> None:
@@ -221,51 +491,64 @@ class KmodDB(KmodEnumerators):
         """
         for line in self.modules_builtin_modinfo.read_bytes().split(b"\x00"):
             """ Lines are in the format <name>.<parameter>=<value>"""
-            line = line.decode("utf-8", errors="ignore").strip()
-            if not line or "." not in line or "=" not in line:
+            dot = line.find(b".")
+            if dot < 0:
                 continue
-            name, parameter = line.split(".", 1)
-            parameter, value = parameter.split("=", 1)
-
-            if parameter != "alias":
+            eq = line.find(b"=", dot + 1)
+            # Only alias parameters are used, so only those records are decoded
+            if eq < 0 or line[dot + 1 : eq] != b"alias":
                 continue
 
+            name = intern(line[:dot].decode("utf-8", errors="ignore").strip())
+            value = line[eq + 1 :].decode("utf-8", errors="ignore").strip()
             # simulate the alias processing as in modules.alias
-            self.process_alias(f"{value.strip()} {name.strip()}")
+            self.process_alias(f"{value} {name}")
             # add the module to the builtin set
-            self.builtin.add(name.strip())
+            self.builtin.add(name)
 
     def get_module_aliases(self):
         """Processes the kernel module aliases from /lib/modules/<kernel_version>/modules.alias."""
-        for line in self.modules_alias.read_text().splitlines():
-            """ Lines are in the format:
-                alias <bus>:<alias> <module>
-                """
-            if not line.startswith("alias "):
-                self.logger.debug(f"Skipping non-alias line: {line}")
-                continue
-            self.process_alias(line)
+        with open(self.modules_alias, "rb") as alias_file:
+            if not fstat(alias_file.fileno()).st_size:
+                return self.logger.warning(f"Kernel module alias file is empty: {c_(alias_file.name, 'red')}")
+            # Map the file and parse the lines in place, rather than copying it into buffers
+            with mmap(alias_file.fileno(), 0, access=ACCESS_READ) as alias_map:
+                for line in iter(alias_map.readline, b""):
+                    """ Lines are in the format:
+                        alias <bus>:<alias> <module>
+                        """
+                    if not line.startswith(b"alias "):
+                        if self.logger.isEnabledFor(DEBUG):
+                            self.logger.debug(f"Skipping non-alias line: {line}")
+                        continue
+                    self.process_alias(line[6:].decode("ascii", errors="ignore"))
 
     def process_alias(self, alias_str: str) -> None:
         """Processes a single kernel module alias string ."""
         alias_str = alias_str.removeprefix("alias ").strip()
         alias_str, module = alias_str.split(" ", 1)
+        # Module names are repeated across many aliases and used as keys in every alias dict
+        module = intern(module.strip())
 
         try:  # Try to the the bus for the alias, if no bus is present, it's a plain alias
             bus, alias = alias_str.split(":", 1)
+            bus = intern(bus)
         except ValueError:
             bus = None
             self.aliases[module].append(alias_str.strip())
-            return self.logger.debug(
-                f"[{c_(module, 'magenta')}] Processing plain alias: {c_(alias_str.strip(), 'blue')}"
-            )
+            self._index_matcher(None, alias_str.strip(), module)
+            if self.logger.isEnabledFor(DEBUG):
+                self.logger.debug(f"[{c_(module, 'magenta')}] Processing plain alias: {c_(alias_str.strip(), 'blue')}")
+            return
 
+        stripped_bus = bus.rstrip("*")  # Busses may be written as <bus>*
         match bus:
-            case bus if bus in self.ignored_busses or bus.replace("*", "") in self.ignored_busses:
-                self.logger.debug(
-                    f"Ignoring alias {c_(alias_str, 'blue')} for module {c_(module, 'magenta')} on bus {c_(bus, 'yellow')}"
-                )
-            case bus if bus in self.plain_busses or bus.replace("*", "") in self.plain_busses:
+            case bus if bus in self._ignored_busses or stripped_bus in self._ignored_busses:
+                if self.logger.isEnabledFor(DEBUG):
+                    self.logger.debug(
+                        f"Ignoring alias {c_(alias_str, 'blue')} for module {c_(module, 'magenta')} on bus {c_(bus, 'yellow')}"
+                    )
+            case bus if bus in self._plain_busses or stripped_bus in self._plain_busses:
                 self.process_simple_alias(alias, module, bus)
             case "acpi" | "acpi*":
                 self._process_acpi_alias(alias, module)
@@ -284,40 +567,70 @@ class KmodDB(KmodEnumerators):
         """Adds a simple alias to the aliases dictionary for the given module.
         If the module is defined in self.simple_busses, it will be added to the attribute for that bus.
         """
-        self.logger.debug(f"[{c_(module, 'magenta')}]({c_(bus or '-', 'yellow')}) Processing alias: {c_(alias, 'blue')}")
-        if bus and bus in self.plain_busses:
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger.debug(
+                f"[{c_(module, 'magenta')}]({c_(bus or '-', 'yellow')}) Processing alias: {c_(alias, 'blue')}"
+            )
+        if bus and bus in self._plain_busses:
             getattr(self, bus)[module].append(alias)
+            self._index_matcher(bus, alias, module)
             return
 
         self.aliases[module].append(alias)
+        self._index_matcher(None, alias, module)
+
+    def _index_matcher(self, bus: str, matcher: str, module: str) -> int:
+        """Adds a matcher to the lists for the bus, and to its alias trie if it has been built.
+        Returns the index of the matcher.
+        """
+        index = len(self._bus_patterns[bus])
+        self._bus_patterns[bus].append(matcher)
+        self._bus_modules[bus].append(module)
+        self._bus_matchers[bus].append(None)
+        module_ranks = self._bus_module_ranks[bus]
+        self._bus_ranks[bus].append(module_ranks.setdefault(module, len(module_ranks)))
+        if (trie := self._bus_tries.get(bus)) is not None:
+            trie.insert(_literal_prefix(matcher).encode(), index)
+            # Cached lookups can only depend on busses whose trie has been built
+            self._resolve_cached.cache_clear()
+        return index
 
     def _process_cpu_alias(self, alias: str, module) -> None:
         """Processes CPU aliases from the kernel module aliases."""
-        self.logger.debug(f"[{c_(module, 'magenta')}] Processing {c_('CPU', 'yellow')} alias: {c_(alias, 'blue')}")
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger.debug(f"[{c_(module, 'magenta')}] Processing {c_('CPU', 'yellow')} alias: {c_(alias, 'blue')}")
         cpuinfo = self.get_alias_keys(alias)
         cpu_type = cpuinfo.pop("type")
         features = cpuinfo.pop("feature")
         if cpu_type == "*":
             if features == "*":
                 self.aliases[module].append(alias)
+                self._index_matcher(None, alias, module)
                 self.logger.info(f"Adding generic CPU alias: {alias} for module: {module}")
                 return
             arch = "*"
             info = "*"
         else:
             arch, info = cpu_type.split(",", 1)
-        match_info = {"arch": arch, "info": info, "features": features}
-        self.cpu[module].append(match_info)
+        self._cpu_arch[module].append(arch)
+        self._cpu_info[module].append(info)
+        self._cpu_features[module].append(features)
 
     def _process_dmi_alias(self, alias: str, module: str) -> None:
         """Processes DMI aliases, which are used to match hardware based on DMI information."""
-        self.logger.debug(f"[{c_(module, 'magenta')}] Processing {c_('DMI', 'yellow')} alias: {c_(alias, 'blue')}")
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger.debug(f"[{c_(module, 'magenta')}] Processing {c_('DMI', 'yellow')} alias: {c_(alias, 'blue')}")
         dmi_parts = [part for part in alias.split(":") if part]  # Split by ':' and remove empty parts
         self.dmi[module].append(dmi_parts)
+        first_part = _literal_prefix(dmi_parts[0]) if dmi_parts else ""
+        self._dmi_by_first_part[first_part].append((module, dmi_parts))
 
     def _process_of_alias(self, alias: str, module: str) -> None:
         """Processes Open Firmware (OF) aliases from the kernel module aliases."""
-        self.logger.debug(f"[{c_(module, 'magenta')}] Processing {c_('Open Firmware', 'yellow')} alias: {c_(alias, 'blue')}")
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger.debug(
+                f"[{c_(module, 'magenta')}] Processing {c_('Open Firmware', 'yellow')} alias: {c_(alias, 'blue')}"
+            )
 
         if not alias.startswith("N*T*C"):
             self.logger.warning(f"OF alias {c_(alias, 'red')} does not start with  N*T*C, skipping.")
@@ -328,14 +641,21 @@ class KmodDB(KmodEnumerators):
 
         matcher = alias.removeprefix("N*T*C")  # Remove the N*T*C prefix
         self.of[module].append(matcher)  # Store the matcher in the DMI aliases
+        index = self._index_matcher("of", matcher, module)
+        if "," in matcher:  # Also index the matcher without the vendor ID, sharing the index of the full matcher
+            vendorless = self._of_vendorless_patterns[index] = matcher.split(",")[-1]
+            if self._of_vendorless_trie is not None:
+                self._of_vendorless_trie.insert(_literal_prefix(vendorless).encode(), index)
 
     def _process_virtio_alias(self, alias: str, module: str) -> None:
         """Processes virtio aliases from the kernel module aliases.
 
         The alias line is in the format: d<device id>v<vendorid>
         """
-        self.logger.debug(f"[{c_(module, 'magenta')}] Processing {c_('virtio', 'yellow')} alias: {c_(alias, 'blue')}")
-        re_str = r"d(?P<device_id>[0-9a-fA-F\*]+)v(?P<vendor_id>[0-9a-fA-F\*]*)"
-        match = search(re_str, alias)
-        if match_info := {"device_id": match.group("device_id"), "vendor_id": match.group("vendor_id")}:
-            self.virtio[module].append(match_info)
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger.debug(
+                f"[{c_(module, 'magenta')}] Processing {c_('virtio', 'yellow')} alias: {c_(alias, 'blue')}"
+            )
+        if not (match := _VIRTIO_RE.search(alias)):
+            return self.logger.warning(f"Invalid virtio alias {c_(alias, 'red')} for module {c_(module, 'magenta')}")
+        self.virtio[module].append({"device_id": match["device_id"], "vendor_id": match["vendor_id"]})
@@ -1,7 +1,10 @@
 __version__ = "0.1.0"
 
 
-from fnmatch import fnmatchcase
+from itertools import chain
+from logging import DEBUG
+from os import O_RDONLY, close, read, readlink, scandir
+from os import open as os_open
 from pathlib import Path
 
 from zenlib.util import colorize as c_
@@ -12,6 +15,29 @@ from .kmod_errors import UnknownAliasError
 _BUILTIN_NO_KMOD = ["pcieport"]
 
 
+def _read_sysfs_attribute(path: str) -> str:
+    """Reads a sysfs attribute with a single read, raises FileNotFoundError if it does not exist."""
+    fd = os_open(path, O_RDONLY)
+    try:
+        return read(fd, 4096).decode("utf-8", errors="ignore").strip()  # sysfs attributes are at most one page
+    finally:
+        close(fd)
+
+
+def _read_modaliases(devices_dir: Path, prefix: str) -> set[str]:
+    """Reads the modalias of each device in a sysfs devices directory, removing the bus prefix.
+    Uses the dirents from scandir and opens each modalias file directly, skipping devices without one.
+    """
+    modaliases = set()
+    with scandir(devices_dir) as devices:
+        for device in devices:
+            try:
+                modaliases.add(_read_sysfs_attribute(f"{device.path}/modalias").removeprefix(prefix))
+            except FileNotFoundError:
+                continue
+    return modaliases
+
+
 class KmodEnumerators:
     """A mixin class to enumerate kernel modules and their metadata."""
 
@@ -22,21 +48,7 @@ class KmodEnumerators:
         if not acpi_devices.exists():
             raise FileNotFoundError("ACPI devices directory not found: /sys/bus/acpi/devices")
 
-        modules = set()
-        modaliases = set()
-        for device in acpi_devices.iterdir():
-            modalias_file = device / "modalias"
-            if not modalias_file.exists():
-                continue
-            modaliases.add(modalias_file.read_text().strip().removeprefix("acpi:"))
-
-        for module, matchers in self.acpi.items():
-            for matcher in matchers:
-                for modalias in modaliases:
-                    if fnmatchcase(modalias, matcher):
-                        self.logger.debug(f"Module {c_(module, 'magenta')} matches ACPI device {c_(modalias, 'cyan')}")
-                        modules.add(module)
-        return modules
+        return self._match_bus_modaliases("acpi", _read_modaliases(acpi_devices, "acpi:"))
 
     def detect_pci_kmods(self) -> set[str]:
         """Detects kernel modules that match the current PCI devices."""
@@ -45,24 +57,22 @@ class KmodEnumerators:
         if not pci_devices.exists():
             raise FileNotFoundError("PCI devices directory not found: /sys/bus/pci/devices")
 
-        modaliases = set()
-        modules = set()
-        for device in pci_devices.iterdir():
-            modalias_file = device / "modalias"
-            if not modalias_file.exists():
-                continue
-            modaliases.add(modalias_file.read_text().strip().removeprefix("pci:"))
-
-        # Use he define module and matcher sets
-        for module, matchers in self.pci.items():
-            # Try each matcher against all of the modaliases
-            for matcher in matchers:
-                # Iterate over each modalias with the assocaited
-                for modalias in modaliases:
-                    if fnmatchcase(modalias, matcher):
-                        self.logger.debug(f"Module {c_(module, 'magenta')} matches PCI device {c_(modalias, 'cyan')}")
-                        modules.add(module)
+        return self._match_bus_modaliases("pci", _read_modaliases(pci_devices, "pci:"))
 
+    def _match_bus_modaliases(self, bus: str, modaliases: set[str]) -> set[str]:
+        """Returns every module with a matcher on the bus matching any of the modaliases.
+        Each modalias is walked through the alias trie for the bus, so only matchers sharing its prefix are tried.
+        """
+        modules = set()
+        trie, bus_modules, matchers = self._bus_trie(bus), self._bus_modules[bus], self._bus_matchers[bus]
+        for modalias in modaliases:
+            for index in trie.candidates(modalias.encode()):
+                if (module := bus_modules[index]) in modules:
+                    continue
+                if (matchers[index] or self._bus_matcher(bus, index))(modalias):
+                    if self.logger.isEnabledFor(DEBUG):
+                        self.logger.debug(f"Module {c_(module, 'magenta')} matches {bus} device {c_(modalias, 'cyan')}")
+                    modules.add(module)
         return modules
 
     def detect_dmi_kmods(self, dmi_str: str = None) -> set[str]:
@@ -79,19 +89,26 @@ class KmodEnumerators:
         dmi_str = dmi_str.removeprefix("dmi:").strip()  # Remove the 'dmi:' prefix if present
         dmi_parts = [part for part in dmi_str.split(":") if part]  # Split by ':' and remove empty parts
 
+        # Only matchers with a first part prefixed by a prefix of the first DMI part can match
+        first_part = dmi_parts[0] if dmi_parts else ""
+        buckets = self._dmi_by_first_part
+        candidates = [buckets[prefix] for n in range(len(first_part) + 1) if (prefix := first_part[:n]) in buckets]
+
         matching_modules = set()
-        for module, matchers in self.dmi.items():
-            for matcher in matchers:
-                for n, part in enumerate(matcher):
-                    if part == "*":
-                        if n > len(dmi_parts) - 1:
-                            break  # Wildcard matcher but dmi string is not long enough
-                    if not fnmatchcase(dmi_parts[n], part):
-                        break
-                else:  # If we didn't break, all matchers matched
-                    matching_modules.add(module)
-                    self.logger.debug(f"Module {c_(module, 'magenta')} matches DMI string {c_(dmi_str, 'cyan')}")
+        matchers = self._matchers
+        for module, matcher in chain.from_iterable(candidates):
+            if module in matching_modules:
+                continue
+            for n, part in enumerate(matcher):
+                if part == "*":
+                    if n > len(dmi_parts) - 1:
+                        break  # Wildcard matcher but dmi string is not long enough
+                if not (matchers.get(part) or self._matcher(part))(dmi_parts[n]):
                     break
+            else:  # If we didn't break, all matchers matched
+                matching_modules.add(module)
+                if self.logger.isEnabledFor(DEBUG):
+                    self.logger.debug(f"Module {c_(module, 'magenta')} matches DMI string {c_(dmi_str, 'cyan')}")
 
         return matching_modules
 
@@ -101,24 +118,33 @@ class KmodEnumerators:
         if not blkdev_path.exists():
             raise FileNotFoundError(f"Block device modalias file not found: {blkdev_path}")
 
+        # Resolve the device path once, then check it and each parent device
+        dev_paths = [blkdev_path.resolve()]
+        while dev_paths[-1].parent != dev_paths[-1]:
+            dev_paths.append(dev_paths[-1].parent)
+
         modules = set()
-        dev_path = blkdev_path.resolve()
-        while True:
-            driver = dev_path / "driver"
+        for dev_path in dev_paths:
+            try:  # List the directory once instead of checking for each file
+                with scandir(dev_path) as entries:
+                    names = {entry.name for entry in entries}
+            except FileNotFoundError:
+                break
+
             driver_name = None
-            modalias = dev_path / "modalias"
-            if driver.exists():
-                driver_name = driver.readlink().name  # Read the symlink to get the driver name
+            if "driver" in names:
+                driver_name = Path(readlink(dev_path / "driver")).name  # Read the symlink to get the driver name
                 if driver_name in self.builtin or driver_name in _BUILTIN_NO_KMOD:
                     self.logger.debug(f"[{dev_path}]({c_(driver_name, 'magenta')}) is a builtin module, skipping.")
                 else:
                     self.logger.debug(f"[{dev_path}] Found driver symlink: {driver_name}")
-                    driver_module = driver.resolve() / "module"
-                    if driver_module.exists():
-                        modules.add(driver_module.readlink().name)  # Read the symlink to get the module name
+                    try:  # The driver symlink is followed while reading its module symlink
+                        modules.add(Path(readlink(dev_path / "driver" / "module")).name)
+                    except FileNotFoundError:
+                        pass
 
-            if modalias.exists():  # If the driver name is not available, try to read the modalias
-                modalias_text = modalias.read_text().strip()
+            if "modalias" in names:  # If the driver name is not available, try to read the modalias
+                modalias_text = _read_sysfs_attribute(f"{dev_path}/modalias")
                 try:
                     module = self.resolve_module_alias(modalias_text)
                     modules.add(module)
@@ -140,10 +166,4 @@ class KmodEnumerators:
                                 f"[{dev_path}]({c_(driver_name, 'magenta')}) Unknown alias: {modalias_text}"
                             )
 
-            parent = dev_path.parent
-            if parent == dev_path or not parent.exists():
-                break
-
-            dev_path = parent
-
         return modules
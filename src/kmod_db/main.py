@@ -8,7 +8,8 @@ def main():
     arguments = [{"flags": ["--acpi"], "help": "Detect ACPI devices", "action": "store_true"},
                  {"flags": ["--pci"], "help": "Detect PCI devices", "action": "store_true"},
                  {"flags": ["--dmi"], "help": "Detect DMI devices", "action": "store_true"},
-                 {"flags": ["--blkdev"], "help": "Get block device kmods"}
+                 {"flags": ["--blkdev"], "help": "Get block device kmods"},
+                 {"flags": ["--no-cache"], "help": "Do not use or write the module info cache", "action": "store_true"}
                  ]
 
     kwargs = get_kwargs("kmod_db", "kernel module database", arguments=arguments)
@@ -16,8 +17,9 @@ def main():
     pci = kwargs.pop("pci", False)
     dmi = kwargs.pop("dmi", False)
     blockdev = kwargs.pop("blkdev", None)
+    use_cache = not kwargs.pop("no_cache", False)
 
-    db = KmodDB(**kwargs)
+    db = KmodDB(use_cache=use_cache, **kwargs)
 
     if acpi:
         print(f"ACPI Kmods: {db.detect_acpi_kmods()}")
@@ -0,0 +1,88 @@
+from os import environ
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from kmod_db import KmodDB
+from kmod_db.kmod_errors import UnknownAliasError
+
+MODULES_ALIAS = """\
+# Aliases extracted from modules themselves.
+alias usb:v1234p0002* modA
+alias usb:v1234p* modB
+alias usb:v1234p0001* modA
+alias fs-ext4 ext4
+alias fs-ex* modC
+"""
+
+
+class SyntheticKmodDB(KmodDB):
+    """A KmodDB which reads its module info from the given directory instead of /lib/modules."""
+
+    kernel_version = "synthetic"  # Replaces the property, which checks /lib/modules
+
+    def __init__(self, modules_dir: Path, *args, **kwargs):
+        self.modules_dir = modules_dir
+        super().__init__(self.kernel_version, *args, **kwargs)
+
+    @property
+    def modules_alias(self) -> Path:
+        return self.modules_dir / "modules.alias"
+
+    @property
+    def modules_builtin_modinfo(self) -> Path:
+        return self.modules_dir / "modules.builtin.modinfo"
+
+
+class TestAliasResolution(TestCase):
+    def setUp(self):
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.modules_dir = Path(tmpdir.name)
+        (self.modules_dir / "modules.alias").write_text(MODULES_ALIAS)
+        (self.modules_dir / "modules.builtin.modinfo").write_bytes(b"")
+        self.db = SyntheticKmodDB(self.modules_dir)
+
+    def test_module_order(self):
+        """Matchers are tried grouped by module, in the order each module was first seen."""
+        self.assertEqual(self.db.resolve_module_alias("usb:v1234p0001"), "modA")
+        self.assertEqual(self.db.resolve_module_alias("usb:v1234p0002"), "modA")
+        self.assertEqual(self.db.resolve_module_alias("usb:v1234p0003"), "modB")
+
+    def test_plain_alias(self):
+        self.assertEqual(self.db.resolve_module_alias("fs-ext4"), "ext4")
+        self.assertEqual(self.db.resolve_module_alias("fs-exfat"), "modC")
+
+    def test_unknown_alias(self):
+        with self.assertRaises(UnknownAliasError):
+            self.db.resolve_module_alias("usb:v4321p0001")
+
+    def test_added_alias(self):
+        """Aliases added after a lookup are used by later lookups."""
+        with self.assertRaises(UnknownAliasError):
+            self.db.resolve_module_alias("fs-btrfs")
+        self.db.process_alias("alias fs-btrfs btrfs")
+        self.assertEqual(self.db.resolve_module_alias("fs-btrfs"), "btrfs")
+
+    def test_bus_mismatch_warning(self):
+        """The bus mismatch warning is logged for every lookup, including cached ones."""
+        with self.assertLogs(self.db.logger, "WARNING") as logs:
+            for _ in range(2):
+                self.assertEqual(self.db.resolve_module_alias("usb:v1234p0001", bus="pci"), "modA")
+        self.assertEqual(len(logs.records), 2)
+
+
+    def test_cache(self):
+        """Module info loaded from the cache resolves like freshly parsed module info."""
+        with patch.dict(environ, {"XDG_CACHE_HOME": str(self.modules_dir / "cache")}):
+            SyntheticKmodDB(self.modules_dir, use_cache=True)
+            cached_db = SyntheticKmodDB(self.modules_dir, use_cache=True)
+            self.assertTrue(cached_db.load_cache())
+        self.assertEqual(cached_db.resolve_module_alias("usb:v1234p0001"), "modA")
+        self.assertEqual(cached_db.resolve_module_alias("usb:v1234p0003"), "modB")
+        self.assertEqual(cached_db.resolve_module_alias("fs-exfat"), "modC")
+
+
+if __name__ == "__main__":
+    main()